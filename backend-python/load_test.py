@@ -0,0 +1,264 @@
+"""Load generator for the /ws detection endpoint.
+
+Opens many concurrent WebSocket connections against a locally running server,
+sends `participant_frame` messages (or raw JPEG bytes) at a fixed rate and
+reports throughput and round-trip latency percentiles as JSON lines.
+
+Usage:
+    python main.py                       # in another terminal
+    python load_test.py --connections 20 --fps 1 --duration 60
+    python load_test.py --mode binary --images ./frames --output report.json
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+import websockets
+
+# ==== CONFIG ====
+DEFAULT_URL = "ws://localhost:8001/ws"
+SYNTHETIC_FRAME_COUNT = 8
+FRAME_SIZE = (640, 480)
+JPEG_QUALITY = 80
+
+
+def load_frames(image_dir: str = None) -> List[bytes]:
+    """Load JPEG fixtures from a directory, or synthesise a set of face-like frames"""
+    if image_dir:
+        paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.jpeg")))
+        frames = []
+        for path in paths:
+            with open(path, "rb") as f:
+                frames.append(f.read())
+        if not frames:
+            raise SystemExit(f"No JPEG images found in {image_dir}")
+        return frames
+
+    frames = []
+    w, h = FRAME_SIZE
+    for i in range(SYNTHETIC_FRAME_COUNT):
+        img = np.full((h, w, 3), 40 + i * 10, dtype=np.uint8)
+        cx = w // 2 + (i - SYNTHETIC_FRAME_COUNT // 2) * 8
+        cv2.ellipse(img, (cx, h // 2), (110, 140), 0, 0, 360, (150, 180, 220), -1)
+        cv2.circle(img, (cx - 40, h // 2 - 30), 12, (40, 40, 40), -1)
+        cv2.circle(img, (cx + 40, h // 2 - 30), 12, (40, 40, 40), -1)
+        cv2.ellipse(img, (cx, h // 2 + 60), (40, 10 + i), 0, 0, 180, (60, 60, 160), -1)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if ok:
+            frames.append(buf.tobytes())
+    return frames
+
+
+def positive_float(value: str) -> float:
+    """argparse type for strictly positive rates and durations"""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be > 0, got {value}")
+    return number
+
+
+def percentile(values: List[float], pct: float) -> float:
+    return round(float(np.percentile(values, pct)), 2) if values else 0.0
+
+
+class LoadStats:
+    """Counters and latency samples shared by all simulated clients"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.connected = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.sent = 0
+        self.send_failures = 0
+        self.responses = 0
+        self.control_messages = 0
+        self.client_errors = 0
+        self.latencies: List[float] = []
+        self.window_latencies: List[float] = []
+        self.window_responses = 0
+        self.window_started = time.time()
+        self.degradation_levels: Dict[str, int] = {}
+
+    def record_response(self, latency_ms: float, data: Dict[str, Any]):
+        self.responses += 1
+        self.window_responses += 1
+        self.latencies.append(latency_ms)
+        self.window_latencies.append(latency_ms)
+        level = str(data.get("degradation", "unknown"))
+        self.degradation_levels[level] = self.degradation_levels.get(level, 0) + 1
+
+    def window_report(self) -> Dict[str, Any]:
+        """Report for the interval since the last call, then reset the window"""
+        now = time.time()
+        elapsed = max(1e-6, now - self.window_started)
+        report = {
+            "elapsed_s": round(now - self.started, 1),
+            "connected": self.connected,
+            "sent": self.sent,
+            "responses": self.responses,
+            "send_failures": self.send_failures,
+            "throughput_rps": round(self.window_responses / elapsed, 2),
+            "latency_p50_ms": percentile(self.window_latencies, 50),
+            "latency_p95_ms": percentile(self.window_latencies, 95),
+            "latency_p99_ms": percentile(self.window_latencies, 99),
+        }
+        self.window_latencies = []
+        self.window_responses = 0
+        self.window_started = now
+        return report
+
+    def summary(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        elapsed = max(1e-6, time.time() - self.started)
+        return {
+            "config": config,
+            "duration_s": round(elapsed, 1),
+            "connect_failures": self.connect_failures,
+            "disconnects": self.disconnects,
+            "client_errors": self.client_errors,
+            "sent": self.sent,
+            "send_failures": self.send_failures,
+            "responses": self.responses,
+            "lost_or_pending": self.sent - self.responses,
+            "control_messages": self.control_messages,
+            "throughput_rps": round(self.responses / elapsed, 2),
+            "latency_ms": {
+                "mean": round(float(np.mean(self.latencies)), 2) if self.latencies else 0.0,
+                "p50": percentile(self.latencies, 50),
+                "p90": percentile(self.latencies, 90),
+                "p95": percentile(self.latencies, 95),
+                "p99": percentile(self.latencies, 99),
+                "max": round(max(self.latencies), 2) if self.latencies else 0.0,
+            },
+            "degradation_levels": self.degradation_levels,
+        }
+
+
+async def run_client(client_id: int, args, frames: List[bytes], stats: LoadStats, deadline: float):
+    """Simulate one interview socket until the deadline"""
+    # Stagger connections so clients do not send in lockstep
+    await asyncio.sleep(client_id * args.ramp_up / max(1, args.connections))
+    try:
+        ws = await websockets.connect(args.url, max_size=None)
+    except Exception:
+        stats.connect_failures += 1
+        return
+
+    stats.connected += 1
+    pending = deque()  # Send timestamps; the server answers frames in order
+    interval = 1.0 / args.fps
+    session_id = f"load_{client_id}_{int(time.time())}"
+
+    async def receiver():
+        nonlocal interval
+        async for raw in ws:
+            data = json.loads(raw)
+            if data.get("type") == "control":
+                stats.control_messages += 1
+                interval_ms = data.get("interval_ms")
+                if data.get("action") == "set_frame_interval" and args.obey_control and interval_ms:
+                    interval = interval_ms / 1000.0
+                continue
+            if pending:
+                stats.record_response((time.perf_counter() - pending.popleft()) * 1000, data)
+
+    async def sender():
+        i = client_id
+        next_send = time.perf_counter()
+        while time.time() < deadline:
+            frame = frames[i % len(frames)]
+            i += 1
+            if args.mode == "binary":
+                payload = frame
+            else:
+                payload = json.dumps({
+                    "type": "participant_frame",
+                    "image": "data:image/jpeg;base64," + base64.b64encode(frame).decode("ascii"),
+                    "roomId": f"load_room_{client_id}",
+                    "userId": f"load_user_{client_id}",
+                    "sessionId": session_id,
+                })
+            try:
+                pending.append(time.perf_counter())
+                await ws.send(payload)
+                stats.sent += 1
+            except Exception:
+                pending.pop()
+                stats.send_failures += 1
+                return
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+        # Give in-flight frames a moment to come back before closing
+        await asyncio.sleep(args.drain)
+
+    receive_task = asyncio.create_task(receiver())
+    try:
+        await sender()
+    finally:
+        receive_task.cancel()
+        try:
+            await receive_task
+        except (asyncio.CancelledError, Exception):
+            # A misbehaving socket must not abort the whole run
+            pass
+        if ws.close_code is not None and time.time() < deadline:
+            stats.disconnects += 1
+        stats.connected -= 1
+        await ws.close()
+
+
+async def reporter(stats: LoadStats, interval: float, deadline: float):
+    while time.time() < deadline:
+        await asyncio.sleep(interval)
+        print(json.dumps(stats.window_report()), flush=True)
+
+
+async def main(args):
+    frames = load_frames(args.images)
+    stats = LoadStats()
+    deadline = time.time() + args.duration
+    config = {
+        "url": args.url,
+        "connections": args.connections,
+        "fps": args.fps,
+        "mode": args.mode,
+        "frames": len(frames),
+        "duration_s": args.duration,
+    }
+
+    report_task = asyncio.create_task(reporter(stats, args.report_interval, deadline))
+    results = await asyncio.gather(*(run_client(i, args, frames, stats, deadline) for i in range(args.connections)),
+                                   return_exceptions=True)
+    stats.client_errors = sum(isinstance(r, Exception) for r in results)
+    report_task.cancel()
+
+    summary = stats.summary(config)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent interview socket load generator")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--connections", type=int, default=10, help="Concurrent WebSocket clients")
+    parser.add_argument("--fps", type=positive_float, default=1.0, help="Frames per second per client")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test length in seconds")
+    parser.add_argument("--mode", choices=["json", "binary"], default="json")
+    parser.add_argument("--images", help="Directory of JPEG fixtures (synthetic frames if omitted)")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="Seconds over which clients connect")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to wait for responses after sending")
+    parser.add_argument("--obey-control", action="store_true", help="Follow server frame-interval requests")
+    parser.add_argument("--output", help="Write the final JSON summary to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -3,14 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 import cv2
 import numpy as np
 from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
 import mediapipe as mp
 import webrtcvad
 import pyaudio
-from ultralytics import YOLO
-from deepface import DeepFace
+from decouple import config
 import asyncio
 import uvicorn
-from typing import Dict, Any
+from typing import Dict, Any, Union
 import base64
 import time
 import json
@@ -40,10 +40,177 @@ LIPSYNC_THRESHOLD = 0.035
 BGVOICE_THRESHOLD = 0.02
 FACE_VERIFICATION_THRESHOLD = 0.7
 
-class AIDetector:
+# Inference backend: "native" (PyTorch YOLO + TensorFlow DeepFace) or "onnx"
+# (models exported with `python onnx_backend.py export`, served by ONNX Runtime)
+INFERENCE_BACKEND = config("INFERENCE_BACKEND", default="native")
+ONNX_QUANTIZED = config("ONNX_QUANTIZED", default=False, cast=bool)
+ONNX_INTRA_OP_THREADS = config("ONNX_INTRA_OP_THREADS", default=0, cast=int)
+
+# Overload control: shed work progressively when frames take too long
+OVERLOAD_HIGH_LATENCY_MS = config("OVERLOAD_HIGH_LATENCY_MS", default=400.0, cast=float)
+OVERLOAD_LOW_LATENCY_MS = config("OVERLOAD_LOW_LATENCY_MS", default=150.0, cast=float)
+OVERLOAD_HIGH_QUEUE_DEPTH = config("OVERLOAD_HIGH_QUEUE_DEPTH", default=4, cast=int)
+OVERLOAD_DEGRADE_HOLD_SECONDS = 3.0  # Minimum time before shedding another level
+OVERLOAD_RESTORE_HOLD_SECONDS = 15.0  # Load must stay low this long before restoring a level
+OVERLOAD_RESTORE_UTILIZATION = 0.7  # Max predicted inference worker busy fraction after restoring
+OVERLOAD_RATE_WINDOW_SECONDS = 10.0
+OVERLOAD_COST_STALE_SECONDS = 60.0  # Ignore a level's measured cost once it is this old
+OVERLOAD_LATENCY_SMOOTHING = 0.2
+DEGRADED_VERIFICATION_EVERY_N_FRAMES = 5
+DEFAULT_FRAME_INTERVAL_MS = 1000
+DEGRADED_FRAME_INTERVAL_MS = 2000
+# Gender (YOLO on every frame) goes first: mood only runs every
+# MOOD_ANALYZE_EVERY_N_FRAMES frames, so shedding it alone barely reduces load
+DEGRADATION_LEVELS = ["normal", "no_gender", "no_mood", "reduced_verification", "reduced_frame_rate"]
+
+# Only import the frameworks the selected backend needs
+if INFERENCE_BACKEND == "onnx":
+    from onnx_backend import (OnnxGenderModel, OnnxEmotionModel, YOLO_ONNX_PATH,
+                              EMOTION_ONNX_PATH, quantized_path)
+else:
+    from ultralytics import YOLO
+    from deepface import DeepFace
+
+class OverloadController:
+    """Track frame latency and backlog and pick a degradation level.
+
+    Each level sheds one more piece of work on top of the previous ones:
+    gender, then mood, then verification runs every few frames, then clients
+    are asked to send frames less often. Latency is measured from receiving a
+    frame to replying, so it includes time spent queued behind other sessions.
+
+    Degrading needs OVERLOAD_DEGRADE_HOLD_SECONDS since the last change.
+    Restoring needs low latency for OVERLOAD_RESTORE_HOLD_SECONDS and a
+    prediction, from the inference cost previously measured at the lower
+    level and the current frame arrival rate, that the worker will stay below
+    OVERLOAD_RESTORE_UTILIZATION once the work comes back. A cost older than
+    OVERLOAD_COST_STALE_SECONDS is not trusted, so a past spike cannot keep
+    the service degraded after load has dropped.
+    """
+
     def __init__(self):
+        self.level = 0
+        self.latency_ms = None
+        self.queue_depth = 0
+        self.frames_processed = 0
+        self.last_change = time.time()
+        self.relaxed_since = None
+        self.arrivals = deque()
+        # Smoothed inference cost (excluding queueing) observed at each level
+        self.service_ms = [None] * len(DEGRADATION_LEVELS)
+        self.service_updated = [0.0] * len(DEGRADATION_LEVELS)
+
+    @staticmethod
+    def _smooth(previous, value: float) -> float:
+        if previous is None:
+            return value
+        return previous + OVERLOAD_LATENCY_SMOOTHING * (value - previous)
+
+    def _arrival_rate(self, now: float) -> float:
+        """Frames per second received over the last OVERLOAD_RATE_WINDOW_SECONDS"""
+        while self.arrivals and now - self.arrivals[0] > OVERLOAD_RATE_WINDOW_SECONDS:
+            self.arrivals.popleft()
+        return len(self.arrivals) / OVERLOAD_RATE_WINDOW_SECONDS
+
+    def _restore_fits(self, now: float) -> bool:
+        """Predict whether the next lower level keeps the inference worker unsaturated"""
+        cost_ms = self.service_ms[self.level - 1]
+        if cost_ms is None or now - self.service_updated[self.level - 1] > OVERLOAD_COST_STALE_SECONDS:
+            return True
+        rate = self._arrival_rate(now)
+        if self.frame_interval_ms != DEFAULT_FRAME_INTERVAL_MS:
+            # Clients go back to the default frame rate when this level is lifted
+            rate *= self.frame_interval_ms / DEFAULT_FRAME_INTERVAL_MS
+        return rate * cost_ms / 1000 < OVERLOAD_RESTORE_UTILIZATION
+
+    def frame_received(self):
+        """Register a frame waiting for inference"""
+        self.queue_depth += 1
+        self.arrivals.append(time.time())
+
+    def frame_dropped(self):
+        """Register a frame that failed before producing a result"""
+        self.queue_depth = max(0, self.queue_depth - 1)
+
+    def frame_done(self, latency_ms: float, service_ms: float) -> bool:
+        """Register a finished frame; return True if the frame rate hint changed
+
+        `latency_ms` runs from receipt to result, `service_ms` is inference alone.
+        """
+        backlog = self.queue_depth  # Includes this frame
+        self.queue_depth = max(0, self.queue_depth - 1)
+        self.frames_processed += 1
+        self.latency_ms = self._smooth(self.latency_ms, latency_ms)
+        now = time.time()
+        self.service_ms[self.level] = self._smooth(self.service_ms[self.level], service_ms)
+        self.service_updated[self.level] = now
+        old_interval = self.frame_interval_ms
+        overloaded = self.latency_ms > OVERLOAD_HIGH_LATENCY_MS or backlog >= OVERLOAD_HIGH_QUEUE_DEPTH
+        relaxed = self.latency_ms < OVERLOAD_LOW_LATENCY_MS and backlog <= 1
+
+        if overloaded:
+            self.relaxed_since = None
+            if self.level < len(DEGRADATION_LEVELS) - 1 and now - self.last_change >= OVERLOAD_DEGRADE_HOLD_SECONDS:
+                self.level += 1
+                self.last_change = now
+                logger.warning(f"⚠️ Overload: degrading to '{DEGRADATION_LEVELS[self.level]}' "
+                               f"(latency {self.latency_ms:.0f}ms, queue {backlog})")
+        elif relaxed and self.level > 0 and self._restore_fits(now):
+            if self.relaxed_since is None:
+                self.relaxed_since = now
+            if now - self.relaxed_since >= OVERLOAD_RESTORE_HOLD_SECONDS:
+                self.level -= 1
+                self.last_change = now
+                self.relaxed_since = None
+                logger.info(f"✅ Load dropped: restoring to '{DEGRADATION_LEVELS[self.level]}' "
+                            f"(latency {self.latency_ms:.0f}ms, queue {backlog})")
+        else:
+            self.relaxed_since = None
+        return self.frame_interval_ms != old_interval
+
+    @property
+    def gender_enabled(self) -> bool:
+        return self.level < 1
+
+    @property
+    def mood_enabled(self) -> bool:
+        return self.level < 2
+
+    @property
+    def verification_every_n_frames(self) -> int:
+        return DEGRADED_VERIFICATION_EVERY_N_FRAMES if self.level >= 3 else 1
+
+    @property
+    def frame_interval_ms(self) -> int:
+        return DEGRADED_FRAME_INTERVAL_MS if self.level >= 4 else DEFAULT_FRAME_INTERVAL_MS
+
+    def control_message(self) -> Dict[str, Any]:
+        """WebSocket message asking clients to adjust their frame rate"""
+        return {
+            "type": "control",
+            "action": "set_frame_interval",
+            "interval_ms": self.frame_interval_ms,
+            "degradation_level": self.level,
+            "degradation": DEGRADATION_LEVELS[self.level]
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "degradation_level": self.level,
+            "degradation": DEGRADATION_LEVELS[self.level],
+            "latency_ms": round(self.latency_ms or 0.0, 1),
+            "inference_ms": round(self.service_ms[self.level] or 0.0, 1),
+            "queue_depth": self.queue_depth,
+            "frames_per_second": round(self._arrival_rate(time.time()), 2),
+            "frames_processed": self.frames_processed,
+            "frame_interval_ms": self.frame_interval_ms
+        }
+
+class AIDetector:
+    def __init__(self, overload: OverloadController):
         self.running = True
         self.interview_active = False  # Track interview state
+        self.overload = overload
         
         # Mediapipe
         self.mp_face_mesh = mp.solutions.face_mesh
@@ -66,18 +233,31 @@ class AIDetector:
         
         # Gender detection
         try:
-            self.model = YOLO("best (6).pt")
-            try:
-                self.model.to("cuda")
-                logger.info("✅ YOLO model loaded on GPU")
-            except:
-                logger.info("✅ YOLO model loaded on CPU")
+            if INFERENCE_BACKEND == "onnx":
+                path = quantized_path(YOLO_ONNX_PATH) if ONNX_QUANTIZED else YOLO_ONNX_PATH
+                self.model = OnnxGenderModel(path, ONNX_INTRA_OP_THREADS)
+                logger.info(f"✅ YOLO model loaded with ONNX Runtime ({path})")
+            else:
+                self.model = YOLO("best (6).pt")
+                try:
+                    self.model.to("cuda")
+                    logger.info("✅ YOLO model loaded on GPU")
+                except:
+                    logger.info("✅ YOLO model loaded on CPU")
         except Exception as e:
             logger.error(f"❌ YOLO model loading failed: {e}")
             self.model = None
         self.latest_gender = "Unknown"
         
         # Mood detection
+        self.emotion_model = None
+        if INFERENCE_BACKEND == "onnx":
+            try:
+                path = quantized_path(EMOTION_ONNX_PATH) if ONNX_QUANTIZED else EMOTION_ONNX_PATH
+                self.emotion_model = OnnxEmotionModel(path, ONNX_INTRA_OP_THREADS)
+                logger.info(f"✅ Emotion model loaded with ONNX Runtime ({path})")
+            except Exception as e:
+                logger.error(f"❌ Emotion model loading failed: {e}")
         self.mood_history = deque(maxlen=MOOD_HISTORY_LEN)
         self.current_mood = "neutral"
         self.mood_frame_counter = 0
@@ -115,6 +295,7 @@ class AIDetector:
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.reference_face = None
         self.verification_status = "Not set"
+        self.verification_frame_counter = 0
         
         # Store the latest frame from frontend
         self.latest_frame = None
@@ -135,11 +316,13 @@ class AIDetector:
             self.audio_thread.start()
             logger.info("✅ Audio processing thread started")
 
-    async def set_frame_from_frontend(self, frame_data: str):
-        """Receive frame from frontend as base64"""
+    async def set_frame_from_frontend(self, frame_data: Union[str, bytes]):
+        """Receive frame from frontend as base64 or raw encoded image bytes"""
         try:
             # Convert base64 to image
-            if frame_data.startswith('data:image/'):
+            if isinstance(frame_data, bytes):
+                image_data = frame_data
+            elif frame_data.startswith('data:image/'):
                 image_data = base64.b64decode(frame_data.split(',')[1])
             else:
                 image_data = base64.b64decode(frame_data)
@@ -251,7 +434,12 @@ class AIDetector:
                 return
 
             face_rgb = cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB)
-            result = DeepFace.analyze(face_rgb, actions=['emotion'], enforce_detection=False)
+            if INFERENCE_BACKEND == "onnx":
+                if self.emotion_model is None:
+                    return
+                result = self.emotion_model.analyze(face_rgb)
+            else:
+                result = DeepFace.analyze(face_rgb, actions=['emotion'], enforce_detection=False)
 
             if isinstance(result, list) and len(result) > 0:
                 res = result[0]
@@ -397,6 +585,8 @@ class AIDetector:
             "speech_confidence": round(self.speech_confidence, 3),
             "mouth_ratio": round(float(self.mouth_ratio_debug), 4),
             "interview_active": self.interview_active,
+            "degradation_level": self.overload.level,
+            "degradation": DEGRADATION_LEVELS[self.overload.level],
             "timestamp": time.time()
         }
 
@@ -423,9 +613,18 @@ class AIDetector:
             logger.warning("⚠️ No frame available for reference capture")
             return False
 
-    def process_frame(self):
-        """Process the latest frame from frontend and return detection data"""
-        frame = self.get_latest_frame()
+    def process_frame(self, frame=None):
+        """Process a frame (default: the latest from frontend) and return detection data"""
+        if frame is None:
+            frame = self.get_latest_frame()
+        
+        # Shed signals must not report values from old (possibly other sessions') frames;
+        # clearing them also means a restored signal starts again from fresh results
+        if not self.overload.gender_enabled:
+            self.latest_gender = "Unknown"
+        if not self.overload.mood_enabled:
+            self.current_mood = "Unknown"
+            self.mood_history.clear()
         
         # Return default data when no frame available
         if frame is None:
@@ -442,16 +641,22 @@ class AIDetector:
                 "speech_confidence": round(self.speech_confidence, 3),
                 "mouth_ratio": 0.0,
                 "interview_active": self.interview_active,
+                "degradation_level": self.overload.level,
+                "degradation": DEGRADATION_LEVELS[self.overload.level],
                 "timestamp": time.time()
             }
         
-        # Process all detection components
+        # Process all detection components, skipping what the overload level sheds
         try:
             mesh_results = self.process_face(frame)
             self.process_noise(frame)
-            self.process_verification(frame)
-            self.process_gender(frame)
-            self.process_mood(frame, mesh_results)
+            self.verification_frame_counter += 1
+            if self.verification_frame_counter % self.overload.verification_every_n_frames == 0:
+                self.process_verification(frame)
+            if self.overload.gender_enabled:
+                self.process_gender(frame)
+            if self.overload.mood_enabled:
+                self.process_mood(frame, mesh_results)
         except Exception as e:
             logger.error(f"❌ Error processing frame: {e}")
         
@@ -487,10 +692,66 @@ class AIDetector:
 
 # Initialize AI detector
 logger.info("🚀 Initializing AI Detection System...")
-ai_detector = AIDetector()
+overload_controller = OverloadController()
+ai_detector = AIDetector(overload_controller)
 
 active_connections = []
 
+async def broadcast_frame_rate():
+    """Tell every connected client the frame interval for the current load"""
+    message = overload_controller.control_message()
+    for connection in list(active_connections):
+        try:
+            await connection.send_json(message)
+        except Exception as e:
+            logger.error(f"❌ Failed to send control message: {e}")
+
+# Detection models are not thread-safe: a single worker runs inference while
+# the event loop keeps accepting (and counting) frames from other sessions
+inference_executor = ThreadPoolExecutor(max_workers=1)
+
+async def run_on_inference_worker(fn, *args):
+    """Run detector work on the inference thread so it never races a frame in progress"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, fn, *args)
+
+async def process_frame_with_overload(received_at: float):
+    """Run detection off the event loop and feed its latency to the overload controller"""
+    # Snapshot before awaiting so another session's frame cannot replace it
+    frame = ai_detector.get_latest_frame()
+
+    def timed_process():
+        start = time.perf_counter()
+        data = ai_detector.process_frame(frame)
+        return data, (time.perf_counter() - start) * 1000
+
+    detection_data, service_ms = await run_on_inference_worker(timed_process)
+    latency_ms = (time.perf_counter() - received_at) * 1000
+    rate_changed = overload_controller.frame_done(latency_ms, service_ms)
+    return detection_data, rate_changed
+
+async def handle_frame(websocket: WebSocket, frame_data: Union[str, bytes, None], ids: Dict[str, Any] = None):
+    """Decode a frame, run detection and send the result (plus any frame rate change)"""
+    received_at = time.perf_counter()
+    overload_controller.frame_received()
+    try:
+        if frame_data:
+            success = await ai_detector.set_frame_from_frontend(frame_data)
+            if not success:
+                logger.warning("⚠️ Failed to process frame from frontend")
+        
+        detection_data, rate_changed = await process_frame_with_overload(received_at)
+    except BaseException:
+        # Errors and cancellation must not leave the frame counted as queued
+        overload_controller.frame_dropped()
+        raise
+    
+    if ids:
+        detection_data.update(ids)
+    await websocket.send_json(detection_data)
+    if rate_changed:
+        await broadcast_frame_rate()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -498,51 +759,47 @@ async def websocket_endpoint(websocket: WebSocket):
     logger.info(f"✅ New WebSocket connection. Total connections: {len(active_connections)}")
     
     try:
+        # Late joiners should throttle straight away if we are already degraded
+        if overload_controller.frame_interval_ms != DEFAULT_FRAME_INTERVAL_MS:
+            await websocket.send_json(overload_controller.control_message())
+        
         while True:
             # Wait for data from frontend
-            data = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            if message.get("bytes") is not None:
+                # Binary message: raw JPEG bytes, no base64/JSON overhead
+                await handle_frame(websocket, message["bytes"])
+                continue
+            
+            data = message.get("text") or ""
             
             try:
                 # Try to parse as JSON first (could be a command or frame data)
                 json_data = json.loads(data)
                 
                 if json_data.get('type') == 'participant_frame':
-                    # It's a participant frame data
-                    frame_data = json_data.get('image')
-                    room_id = json_data.get('roomId')
-                    user_id = json_data.get('userId')
-                    session_id = json_data.get('sessionId')
-                    
-                    if frame_data:
-                        success = await ai_detector.set_frame_from_frontend(frame_data)
-                        if not success:
-                            logger.warning("⚠️ Failed to process frame from frontend")
-                    
-                    # Process detection and send back results
-                    detection_data = ai_detector.process_frame()
-                    detection_data['room_id'] = room_id
-                    detection_data['user_id'] = user_id
-                    detection_data['session_id'] = session_id
-                    
-                    await websocket.send_json(detection_data)
+                    # It's a participant frame data: process and send back results
+                    await handle_frame(websocket, json_data.get('image'), {
+                        'room_id': json_data.get('roomId'),
+                        'user_id': json_data.get('userId'),
+                        'session_id': json_data.get('sessionId')
+                    })
                     
                 elif json_data.get('type') == 'command':
                     # Handle commands
                     command = json_data.get('command')
                     if command == 'start_interview':
-                        ai_detector.start_interview()
+                        await run_on_inference_worker(ai_detector.start_interview)
                     elif command == 'stop_interview':
-                        ai_detector.stop_interview()
+                        await run_on_inference_worker(ai_detector.stop_interview)
                     
             except json.JSONDecodeError:
                 # If not JSON, assume it's base64 frame data (legacy format)
                 if data.startswith('data:image/') or len(data) > 1000:
-                    await ai_detector.set_frame_from_frontend(data)
-                    
-                    # Send detection data back
-                    detection_data = ai_detector.process_frame()
-                    if detection_data:
-                        await websocket.send_json(detection_data)
+                    await handle_frame(websocket, data)
                 
     except WebSocketDisconnect:
         active_connections.remove(websocket)
@@ -557,7 +814,7 @@ async def start_interview():
     """Start interview session"""
     try:
         logger.info("🎬 Starting interview via API...")
-        ai_detector.start_interview()
+        await run_on_inference_worker(ai_detector.start_interview)
         
         response_data = {
             "status": "success",
@@ -584,7 +841,7 @@ async def stop_interview():
     """Stop interview session"""
     try:
         logger.info("🛑 Stopping interview via API...")
-        ai_detector.stop_interview()
+        await run_on_inference_worker(ai_detector.stop_interview)
         
         response_data = {
             "status": "success",
@@ -618,7 +875,7 @@ async def end_interview():
 async def set_reference_face():
     """Set reference face for verification"""
     try:
-        success = ai_detector.set_reference_face()
+        success = await run_on_inference_worker(ai_detector.set_reference_face)
         if success:
             return {
                 "status": "success", 
@@ -648,6 +905,8 @@ async def health_check():
         "active_connections": len(active_connections),
         "audio_initialized": ai_detector.stream is not None,
         "model_loaded": ai_detector.model is not None,
+        "inference_backend": INFERENCE_BACKEND,
+        "overload": overload_controller.get_status(),
         "timestamp": time.time()
     }
 
@@ -693,7 +952,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("🛑 Application shutdown initiated...")
-    ai_detector.cleanup()
+    await run_on_inference_worker(ai_detector.cleanup)
+    inference_executor.shutdown(wait=False)
     logger.info("✅ Application shutdown completed")
 
 if __name__ == "__main__":
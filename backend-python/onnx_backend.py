@@ -0,0 +1,288 @@
+"""ONNX Runtime CPU backend for the gender (YOLO) and emotion (DeepFace) models.
+
+Usage:
+    python onnx_backend.py export  [--quantize]
+    python onnx_backend.py compare --images <dir> [--runs 20]
+
+`export` converts both models once; `compare` runs the native PyTorch/TensorFlow
+backends and the ONNX models on the same images and reports label agreement
+and per-inference latency. Only `export` and `compare` import ultralytics /
+deepface; serving with INFERENCE_BACKEND=onnx needs onnxruntime alone.
+"""
+import argparse
+import ast
+import glob
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+# ==== CONFIG ====
+YOLO_WEIGHTS_PATH = "best (6).pt"
+YOLO_ONNX_PATH = "models/gender_yolo.onnx"
+EMOTION_ONNX_PATH = "models/emotion.onnx"
+YOLO_IMGSZ = 640
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+DEEPFACE_TARGET_SIZE = (224, 224)
+EMOTION_PREPROCESSING_NOTE = ("onnx emotion path resizes and pads like DeepFace but skips its "
+                              "opencv face detection and eye alignment on the crop")
+
+
+def quantized_path(path: str) -> str:
+    """Path of the int8 variant of an exported model"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.int8{ext}"
+
+
+def create_session(path: str, intra_op_threads: int = 0) -> ort.InferenceSession:
+    """Create a CPU inference session; 0 threads lets ONNX Runtime decide"""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxBoxes:
+    """Minimal stand-in for ultralytics Boxes (only `.data` is used)"""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.data
+
+
+class OnnxDetection:
+    """Minimal stand-in for an ultralytics Results entry"""
+
+    def __init__(self, boxes: np.ndarray):
+        self.boxes = OnnxBoxes(boxes)
+
+
+class OnnxGenderModel:
+    """YOLOv8 gender detector served through ONNX Runtime.
+
+    Callable like `YOLO(...)` so `AIDetector.process_gender` needs no changes:
+    returns a one-element list whose `boxes.data` rows are
+    (x1, y1, x2, y2, conf, cls). Only the best box per anchor is kept and no
+    NMS is applied, since callers only ever use the top-confidence box.
+    """
+
+    def __init__(self, path: str = YOLO_ONNX_PATH, intra_op_threads: int = 0):
+        self.session = create_session(path, intra_op_threads)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.imgsz = int(model_input.shape[2]) if isinstance(model_input.shape[2], int) else YOLO_IMGSZ
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def preprocess(self, frame):
+        """Letterbox a BGR frame to a square NCHW float tensor"""
+        ih, iw = frame.shape[:2]
+        scale = min(self.imgsz / ih, self.imgsz / iw)
+        nh, nw = int(round(ih * scale)), int(round(iw * scale))
+        top = (self.imgsz - nh) // 2
+        left = (self.imgsz - nw) // 2
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return blob, scale, left, top
+
+    def __call__(self, frame, verbose: bool = False) -> List[OnnxDetection]:
+        blob, scale, left, top = self.preprocess(frame)
+        # Output is (1, 4 + num_classes, num_anchors) with xywh boxes
+        output = self.session.run(None, {self.input_name: blob})[0][0].T
+        scores = output[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(cls)), cls]
+        keep = conf > 0.25
+        if not np.any(keep):
+            return [OnnxDetection(np.zeros((0, 6), dtype=np.float32))]
+
+        xywh = output[keep, :4]
+        x1 = (xywh[:, 0] - xywh[:, 2] / 2 - left) / scale
+        y1 = (xywh[:, 1] - xywh[:, 3] / 2 - top) / scale
+        x2 = (xywh[:, 0] + xywh[:, 2] / 2 - left) / scale
+        y2 = (xywh[:, 1] + xywh[:, 3] / 2 - top) / scale
+        boxes = np.stack([x1, y1, x2, y2, conf[keep], cls[keep].astype(np.float32)], axis=1)
+        return [OnnxDetection(boxes)]
+
+
+class OnnxEmotionModel:
+    """DeepFace emotion classifier served through ONNX Runtime.
+
+    `analyze` mirrors the `DeepFace.analyze(..., actions=['emotion'])` result
+    shape, so `AIDetector.process_mood` consumes either backend unchanged.
+    The face is expected to be cropped already: unlike DeepFace, no opencv
+    detector or eye alignment is run on the crop, so scores can differ
+    slightly when DeepFace finds a tighter face inside it.
+    """
+
+    def __init__(self, path: str = EMOTION_ONNX_PATH, intra_op_threads: int = 0):
+        self.session = create_session(path, intra_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def preprocess(self, face_img):
+        """Resize-and-pad to 224x224 like DeepFace 0.0.79, then grayscale 48x48 in [0, 1]"""
+        th, tw = DEEPFACE_TARGET_SIZE
+        factor = min(th / face_img.shape[0], tw / face_img.shape[1])
+        img = cv2.resize(face_img, (int(face_img.shape[1] * factor), int(face_img.shape[0] * factor)))
+        diff_h = th - img.shape[0]
+        diff_w = tw - img.shape[1]
+        img = np.pad(img, ((diff_h // 2, diff_h - diff_h // 2), (diff_w // 2, diff_w - diff_w // 2), (0, 0)),
+                     "constant")
+        if img.shape[0:2] != DEEPFACE_TARGET_SIZE:
+            img = cv2.resize(img, (tw, th))
+        img = img.astype(np.float32) / 255.0
+
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, (48, 48))
+        return gray[None, :, :, None]
+
+    def analyze(self, face_img) -> List[Dict[str, Any]]:
+        predictions = self.session.run(None, {self.input_name: self.preprocess(face_img)})[0][0]
+        total = float(predictions.sum()) or 1.0
+        emotions = {label: 100 * float(p) / total for label, p in zip(EMOTION_LABELS, predictions)}
+        dominant = max(emotions.items(), key=lambda kv: kv[1])[0]
+        return [{"emotion": emotions, "dominant_emotion": dominant}]
+
+
+def export_models(quantize: bool = False, imgsz: int = YOLO_IMGSZ):
+    """Export YOLO and DeepFace emotion models to ONNX (optionally int8)"""
+    from ultralytics import YOLO
+    from deepface import DeepFace
+    import tensorflow as tf
+    import tf2onnx
+
+    os.makedirs(os.path.dirname(YOLO_ONNX_PATH), exist_ok=True)
+
+    exported = YOLO(YOLO_WEIGHTS_PATH).export(format="onnx", imgsz=imgsz, simplify=True)
+    os.replace(exported, YOLO_ONNX_PATH)
+    logger.info(f"✅ YOLO exported to {YOLO_ONNX_PATH}")
+
+    emotion_model = DeepFace.build_model("Emotion")
+    spec = (tf.TensorSpec((None, 48, 48, 1), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(emotion_model, input_signature=spec, opset=13, output_path=EMOTION_ONNX_PATH)
+    logger.info(f"✅ Emotion model exported to {EMOTION_ONNX_PATH}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        for path in (YOLO_ONNX_PATH, EMOTION_ONNX_PATH):
+            quantize_dynamic(path, quantized_path(path), weight_type=QuantType.QUInt8)
+            logger.info(f"✅ Quantized model written to {quantized_path(path)}")
+
+
+def _timed(fn, runs: int):
+    """Run fn `runs` times; return (last result, latencies in ms)"""
+    latencies = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, latencies
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "mean_ms": round(float(np.mean(latencies)), 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def _top_gender(results, names) -> Optional[str]:
+    boxes_np = results[0].boxes.data.cpu().numpy()
+    if len(boxes_np) == 0:
+        return None
+    cls = sorted(boxes_np, key=lambda x: x[4], reverse=True)[0][5]
+    return names[int(cls)] if names else str(cls)
+
+
+def compare_backends(image_dir: str, runs: int = 20, quantized: bool = False, intra_op_threads: int = 0):
+    """Check label parity and compare latency between native and ONNX backends"""
+    from ultralytics import YOLO
+    from deepface import DeepFace
+
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.png")))
+    frames = [f for f in (cv2.imread(p) for p in paths) if f is not None]
+    if not frames:
+        raise SystemExit(f"No images found in {image_dir}")
+
+    yolo_path = quantized_path(YOLO_ONNX_PATH) if quantized else YOLO_ONNX_PATH
+    emotion_path = quantized_path(EMOTION_ONNX_PATH) if quantized else EMOTION_ONNX_PATH
+    native_yolo = YOLO(YOLO_WEIGHTS_PATH)
+    onnx_yolo = OnnxGenderModel(yolo_path, intra_op_threads)
+    onnx_emotion = OnnxEmotionModel(emotion_path, intra_op_threads)
+
+    timings = {"yolo_native": [], "yolo_onnx": [], "emotion_native": [], "emotion_onnx": []}
+    gender_agree = emotion_agree = 0
+    emotion_max_diff = 0.0
+
+    for frame in frames:
+        small = cv2.resize(frame, (320, 240))
+        native_res, lat = _timed(lambda: native_yolo(small, verbose=False), runs)
+        timings["yolo_native"] += lat
+        onnx_res, lat = _timed(lambda: onnx_yolo(small), runs)
+        timings["yolo_onnx"] += lat
+        gender_agree += _top_gender(native_res, native_yolo.names) == _top_gender(onnx_res, onnx_yolo.names)
+
+        face_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        native_emo, lat = _timed(
+            lambda: DeepFace.analyze(face_rgb, actions=['emotion'], enforce_detection=False), runs)
+        timings["emotion_native"] += lat
+        onnx_emo, lat = _timed(lambda: onnx_emotion.analyze(face_rgb), runs)
+        timings["emotion_onnx"] += lat
+
+        native_emo = native_emo[0] if isinstance(native_emo, list) else native_emo
+        emotion_agree += native_emo["dominant_emotion"] == onnx_emo[0]["dominant_emotion"]
+        for label in EMOTION_LABELS:
+            diff = abs(native_emo["emotion"][label] - onnx_emo[0]["emotion"][label])
+            emotion_max_diff = max(emotion_max_diff, diff)
+
+    report = {
+        "images": len(frames),
+        "quantized": quantized,
+        "gender_agreement": round(gender_agree / len(frames), 3),
+        "emotion_agreement": round(emotion_agree / len(frames), 3),
+        "emotion_max_abs_diff_pct": round(emotion_max_diff, 2),
+        "emotion_preprocessing_note": EMOTION_PREPROCESSING_NOTE,
+        "latency": {name: _latency_summary(lat) for name, lat in timings.items()},
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="ONNX Runtime backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="Export models to ONNX")
+    export_parser.add_argument("--quantize", action="store_true", help="Also write int8 variants")
+    export_parser.add_argument("--imgsz", type=int, default=YOLO_IMGSZ)
+
+    compare_parser = sub.add_parser("compare", help="Parity and latency vs native backends")
+    compare_parser.add_argument("--images", required=True, help="Directory of sample face images")
+    compare_parser.add_argument("--runs", type=int, default=20)
+    compare_parser.add_argument("--quantized", action="store_true")
+    compare_parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = auto)")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_models(quantize=args.quantize, imgsz=args.imgsz)
+    else:
+        compare_backends(args.images, runs=args.runs, quantized=args.quantized, intra_op_threads=args.threads)
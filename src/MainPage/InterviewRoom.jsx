@@ -50,6 +50,7 @@ function InterviewRoom({ room, onLeave }) {
   const chatMessagesRef = useRef(null);
   const canvasRef = useRef(null);
   const frameIntervalRef = useRef(null);
+  const frameIntervalMsRef = useRef(1000);
   const webrtcManagerRef = useRef(null);
 
   const PYTHON_API_URL = 'http://localhost:8001';
@@ -264,13 +265,24 @@ function InterviewRoom({ room, onLeave }) {
         
         if (participantVideoRef.current && interviewStatus === "active") {
           if (frameIntervalRef.current) clearInterval(frameIntervalRef.current);
-          frameIntervalRef.current = setInterval(captureAndSendFrame, 1000);
+          frameIntervalRef.current = setInterval(captureAndSendFrame, frameIntervalMsRef.current);
         }
       };
       
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+
+          // Backend asks for fewer frames while it is overloaded
+          if (data.type === 'control' && data.action === 'set_frame_interval') {
+            frameIntervalMsRef.current = data.interval_ms;
+            if (frameIntervalRef.current) {
+              clearInterval(frameIntervalRef.current);
+              frameIntervalRef.current = setInterval(captureAndSendFrame, data.interval_ms);
+            }
+            console.log(`⏱️ AI frame interval set to ${data.interval_ms}ms (${data.degradation})`);
+            return;
+          }
           console.log("🤖 Interviewer AI Analysis Data:", data);
           
           const enhancedData = {
@@ -1039,7 +1051,7 @@ function InterviewRoom({ room, onLeave }) {
   useEffect(() => {
     if (isParticipantVideoReady() && aiConnected && interviewStatus === "active") {
       if (frameIntervalRef.current) clearInterval(frameIntervalRef.current);
-      frameIntervalRef.current = setInterval(captureAndSendFrame, 1000);
+      frameIntervalRef.current = setInterval(captureAndSendFrame, frameIntervalMsRef.current);
     }
     
     return () => {
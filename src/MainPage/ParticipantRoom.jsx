@@ -28,6 +28,7 @@ function ParticipantRoom({ room, onLeave }) {
   const chatMessagesRef = useRef(null);
   const canvasRef = useRef(null);
   const frameIntervalRef = useRef(null);
+  const frameIntervalMsRef = useRef(1000);
   const wsRef = useRef(null);
   const webrtcManagerRef = useRef(null);
 
@@ -174,7 +175,7 @@ function ParticipantRoom({ room, onLeave }) {
         setAiConnected(true);
         if (isCameraOn && mediaStream) {
           if (frameIntervalRef.current) clearInterval(frameIntervalRef.current);
-          frameIntervalRef.current = setInterval(captureAndSendFrame, 1000);
+          frameIntervalRef.current = setInterval(captureAndSendFrame, frameIntervalMsRef.current);
           console.log('🤖 AI frame capture started');
         }
       };
@@ -182,6 +183,17 @@ function ParticipantRoom({ room, onLeave }) {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+
+          // Backend asks for fewer frames while it is overloaded
+          if (data.type === 'control' && data.action === 'set_frame_interval') {
+            frameIntervalMsRef.current = data.interval_ms;
+            if (frameIntervalRef.current) {
+              clearInterval(frameIntervalRef.current);
+              frameIntervalRef.current = setInterval(captureAndSendFrame, data.interval_ms);
+            }
+            console.log(`⏱️ AI frame interval set to ${data.interval_ms}ms (${data.degradation})`);
+            return;
+          }
           console.log("🤖 Participant AI Detection Data:", data);
           
           const enhancedData = {
@@ -671,7 +683,7 @@ function ParticipantRoom({ room, onLeave }) {
   useEffect(() => {
     if (isCameraOn && aiConnected && mediaStream) {
       if (frameIntervalRef.current) clearInterval(frameIntervalRef.current);
-      frameIntervalRef.current = setInterval(captureAndSendFrame, 1000);
+      frameIntervalRef.current = setInterval(captureAndSendFrame, frameIntervalMsRef.current);
       console.log('🤖 Started AI frame capture');
     } else if (frameIntervalRef.current) {
       clearInterval(frameIntervalRef.current);